@@ -49,7 +49,18 @@ this script is built to gather):
   43 - last math class (end date)
 """
 
+import array
+import collections
+import csv
+import functools
+import gc
+import hashlib
+import os
+import re
+import tempfile
+import zipfile
 import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.patches as patch
 
@@ -84,6 +95,31 @@ class_dict = {-1: "N/A",
               8: "probability/statistics",
               9: "discrete math"}
 
+# Keywords used to recognize last math class names, mapped to (precedence,
+# class ID) pairs; a name containing several keywords is assigned the class of
+# the one with the lowest precedence value
+class_keywords = {"algebra": (0, 1),
+                  "trigonometry": (1, 2),
+                  "geometry": (2, 3),
+                  "precalculus": (3, 4),
+                  "calculus ii": (4, 6),
+                  "calculus 2": (4, 6),
+                  "calculus iii": (5, 7),
+                  "calculus 3": (5, 7),
+                  "calculus": (6, 5),
+                  "statistics": (7, 8),
+                  "probability": (7, 8),
+                  "discrete": (8, 9)}
+
+# Pattern matching any class keyword (longer keywords tried first)
+class_pattern = re.compile("|".join(re.escape(k) for k in
+                                    sorted(class_keywords, key=len,
+                                           reverse=True)))
+
+# Version of the column rules in parse_report(), such as the season cutoffs
+# (to be increased whenever they change, so that cached columns are rebuilt)
+parse_version = 1
+
 # ALEKS subject area names, in order
 subject_list = ["Whole Numbers, Fractions, and Decimals",                  #  0
                 "Percents, Proportions, and Geometry",                     #  1
@@ -109,6 +145,11 @@ subject_list_short = ["Num/Frac", "Percent/Geo", "Lin Eq/Ineq", "Lines/Lin Sys",
 class Student:
     """An object to contain all information from a student's attempts"""
 
+    # Fixed attribute set, to avoid a per-instance dictionary
+    __slots__ = ('name', 'cohort', 'scores', 'subject_scores', 'module',
+                 'masteries', 'last_level', 'last_class', '_best_idx',
+                 '_best_score')
+
     #--------------------------------------------------------------------------
 
     def __init__(self, name, cohort=None, module=-1, last_level=-1,
@@ -130,17 +171,24 @@ class Student:
         CohortReporter object reads a data file, multiple entries for the same
         student are all read into a single object in order to avoid
         overcounting.
+
+        Scores are kept in compact signed byte arrays, with the subject scores
+        of all attempts stored back to back in a single flat array (see
+        attempt_subjects() for reading a single attempt). Mastery levels are
+        stored the same way, as consecutive before/after pairs.
         """
 
         # Initialize attributes
         self.name = name # student name
         self.cohort = cohort # associated cohort object
-        self.scores = [] # list of overall scores from all attempts
-        self.subject_scores = [] # list of lists of subject scores
+        self.scores = array.array('b') # overall scores from all attempts
+        self.subject_scores = array.array('b') # flat subject scores
         self.module = module # learning modules
-        self.masteries = [] # before/after tuples for each module attempt
+        self.masteries = array.array('b') # flat before/after mastery pairs
         self.last_level = last_level # last math class level
         self.last_class = last_class # last math class list index
+        self._best_idx = -1 # index of best attempt
+        self._best_score = -1 # best overall score
 
     #--------------------------------------------------------------------------
 
@@ -158,9 +206,73 @@ class Student:
         """
 
         self.scores.append(score)
-        self.subject_scores.append(subjects)
-        if mastery != None:
-            self.masteries.append(mastery)
+        self.subject_scores.extend(subjects)
+        if mastery is not None:
+            self.masteries.extend(mastery)
+
+        # Update best attempt (keeping the earliest one in case of ties)
+        if score > self._best_score:
+            self._best_score = score
+            self._best_idx = len(self.scores) - 1
+
+        # Flag the cohort's score arrays for a rebuild
+        if self.cohort is not None:
+            self.cohort.dirty = True
+
+    #--------------------------------------------------------------------------
+
+    def log_buffers(self, scores, subjects, masteries, best):
+        """Student.log_buffers(scores, subjects, masteries, best)
+
+        Adds a nonempty batch of attempts given as raw signed byte buffers.
+
+        Positional arguments:
+            scores (bytes) - overall score of each attempt
+            subjects (bytes) - subject scores of each attempt, back to back
+            masteries (bytes) - before/after mastery levels of each module
+                attempt, back to back
+            best (int) - position within the batch of its first best score
+
+        This has the same effect as calling log_attempt() for each attempt in
+        order, but copies the scores in bulk. CohortReporter.read_file() calls
+        it with slices of whole-file buffers, after locating the best attempt
+        of every student at once.
+        """
+
+        # Append score data in bulk
+        start = len(self.scores)
+        self.scores.frombytes(scores)
+        self.subject_scores.frombytes(subjects)
+        self.masteries.frombytes(masteries)
+
+        # Update best attempt (keeping the earliest one in case of ties)
+        if self.scores[start+best] > self._best_score:
+            self._best_score = self.scores[start+best]
+            self._best_idx = start + best
+
+        # Flag the cohort's score arrays for a rebuild
+        if self.cohort is not None:
+            self.cohort.dirty = True
+
+    #--------------------------------------------------------------------------
+
+    def attempt_subjects(self, index):
+        """Student.attempt_subjects(index)
+
+        Returns the list of subject scores for a given attempt.
+
+        Positional arguments:
+            index (int) - attempt index (negative values count from the end)
+
+        Returns:
+            (list) - list of subject scores, indexed according to subject_list
+                above
+        """
+
+        n = len(subject_list)
+        if index < 0:
+            index += len(self.scores)
+        return self.subject_scores[n*index:n*(index+1)].tolist()
 
     #--------------------------------------------------------------------------
 
@@ -179,10 +291,9 @@ class Student:
         """
 
         if subjects:
-            best = self.scores.index(max(self.scores))
-            return (self.scores[best], self.subject_scores[best])
+            return (self._best_score, self.attempt_subjects(self._best_idx))
         else:
-            return max(self.scores)
+            return self._best_score
     
     #--------------------------------------------------------------------------
 
@@ -198,12 +309,19 @@ class Student:
         Returns:
             (int) - most recent score, OR
             (tuple) - most recent score and list of corresponding subjects
+
+        The most recent attempt is the last one logged for the student. A
+        student with no attempts has a most recent score of -1.
         """
 
+        # Handle students with no attempts
+        if len(self.scores) == 0:
+            return (-1, None) if subjects else -1
+
         if subjects:
-            return (self.scores[0], self.subject_scores[0])
+            return (self.scores[-1], self.attempt_subjects(-1))
         else:
-            return self.scores[0]
+            return self.scores[-1]
 
     #--------------------------------------------------------------------------
 
@@ -219,8 +337,9 @@ class Student:
         will be returned unless the specified module matches this student.
         """
 
-        if module == None or self.module == module:
-            return [m[1] - m[0] for m in self.masteries]
+        if module is None or self.module == module:
+            m = np.frombuffer(self.masteries, dtype=np.int8).reshape(-1, 2)
+            return (m[:,1].astype(np.int16) - m[:,0]).tolist()
         else:
             return []
     
@@ -240,24 +359,39 @@ class Student:
                 subjects from the student's best attempt
         """
 
-        if subset == None:
+        if subset is None:
             subset = [i for i in range(len(subject_list)+1)]
         
         # Find best attempt
-        besti = self.scores.index(max(self.scores))
+        besti = self._best_idx
         
         # Average subject scores from best attempt
+        best_subjects = self.attempt_subjects(besti)
         tot = 0
         for i in range(len(subset)):
-            tot += self.subject_scores[besti][i]
+            tot += best_subjects[i]
         
         return round(tot/len(subset))
 
 #==============================================================================
 
+# Filtered score summary of a cohort, as returned by Cohort.report(), with the
+# best score, most recent score, and best attempt subject scores of each
+# selected student
+CohortReport = collections.namedtuple("CohortReport",
+                                      ["best", "last", "subjects"])
+
+#==============================================================================
+
 class Cohort:
     """An object for storing all students in a cohort."""
 
+    # Fixed attribute set, to avoid a per-instance dictionary
+    __slots__ = ('year', 'season', 'students', 'students_by_idx', 'scores_arr',
+                 'subject_matrix', 'best_rows', 'best_arr', 'last_arr',
+                 'last_level_arr', 'last_class_arr', 'mastery_mat', 'module_arr',
+                 'dirty')
+
     #--------------------------------------------------------------------------
 
     def __init__(self, year, season):
@@ -277,6 +411,19 @@ class Cohort:
         # Initialize student dictionary, indexed by name
         self.students = {}
 
+        # Initialize NumPy score arrays (rebuilt from the students as needed)
+        self.students_by_idx = [] # students in array order
+        self.scores_arr = np.empty(0, dtype=np.int8) # overall attempt scores
+        self.subject_matrix = np.empty((0, len(subject_list)), dtype=np.int8)
+        self.best_rows = np.empty(0, dtype=np.int64) # best attempt per student
+        self.best_arr = np.empty(0, dtype=np.int8) # best score per student
+        self.last_arr = np.empty(0, dtype=np.int8) # last score per student
+        self.last_level_arr = np.empty(0, dtype=np.int8)
+        self.last_class_arr = np.empty(0, dtype=np.int8)
+        self.mastery_mat = np.empty((0, 2), dtype=np.int8) # (initial, final)
+        self.module_arr = np.empty(0, dtype=np.int8) # module per mastery row
+        self.dirty = False # whether the arrays are out of date
+
     #--------------------------------------------------------------------------
 
     def __str__(self):
@@ -285,12 +432,7 @@ class Cohort:
         Converts cohort into a string in FaYY, SpYY, or SuYY format.
         """
 
-        if self.season == 0:
-            return "Su" + str(self.year)
-        elif self.season == 1:
-            return "Fa" + str(self.year)
-        else:
-            return "Sp" + str(self.year)
+        return ("Su", "Fa", "Sp")[self.season] + f"{self.year:02d}"
 
     #--------------------------------------------------------------------------
 
@@ -312,6 +454,7 @@ class Cohort:
         self.students[name] = Student(name, cohort=self, module=module,
                                       last_level=last_level,
                                       last_class=last_class)
+        self.dirty = True
 
     #--------------------------------------------------------------------------
 
@@ -327,6 +470,99 @@ class Cohort:
         # Add student to dictionary and give a pointer to self
         self.students[student.name] = student
         student.cohort = self
+        self.dirty = True
+
+    #--------------------------------------------------------------------------
+
+    def build_arrays(self):
+        """Cohort.build_arrays()
+
+        Rebuilds the cohort's NumPy score arrays from its students.
+
+        The attempt arrays hold one row per attempt for all students, in the
+        order of students_by_idx, and best_rows gives the row of each
+        student's best attempt. They are only rebuilt if the students have
+        changed since the last call, and are used by the aggregate methods
+        below in place of per-student loops. The attempt arrays are read-only
+        views of the students' joined byte buffers.
+        """
+
+        # Skip rebuild if nothing has changed
+        if not self.dirty:
+            return
+
+        # Gather attempts in student order
+        slist = list(self.students.values())
+        counts = np.array([len(s.scores) for s in slist], dtype=np.int64)
+        self.students_by_idx = slist
+        self.scores_arr = np.frombuffer(b''.join(s.scores for s in slist),
+                                        dtype=np.int8)
+        subjects = b''.join(s.subject_scores for s in slist)
+        self.subject_matrix = np.frombuffer(subjects, dtype=np.int8).reshape(
+            -1, len(subject_list))
+        self.last_level_arr = np.array([s.last_level for s in slist],
+                                       dtype=np.int8)
+        self.last_class_arr = np.array([s.last_class for s in slist],
+                                       dtype=np.int8)
+        masteries = b''.join(s.masteries for s in slist)
+        self.mastery_mat = np.frombuffer(masteries, dtype=np.int8).reshape(-1, 2)
+        self.module_arr = np.repeat(np.array([s.module for s in slist],
+                                             dtype=np.int8),
+                                    [len(s.masteries)//2 for s in slist])
+
+        # Locate each student's best attempt within the attempt arrays
+        starts = np.cumsum(counts) - counts
+        self.best_rows = np.full(len(slist), -1, dtype=np.int64)
+        self.best_rows[counts > 0] = (starts + np.array([s._best_idx for s in
+                                      slist], dtype=np.int64))[counts > 0]
+        self.best_arr = np.full(len(slist), -1, dtype=np.int8)
+        self.best_arr[counts > 0] = self.scores_arr[self.best_rows[counts > 0]]
+
+        # Gather each student's most recent (last logged) score
+        self.last_arr = np.full(len(slist), -1, dtype=np.int8)
+        self.last_arr[counts > 0] = self.scores_arr[(starts +
+                                                     counts - 1)[counts > 0]]
+
+        self.dirty = False
+
+    #--------------------------------------------------------------------------
+
+    def filter_index(self, last_level=None, last_class=None, score_range=None):
+        """Cohort.filter_index([last_level][, last_class][, score_range])
+
+        Selects the indices of the students that meet a set of filter criteria.
+
+        Keyword arguments:
+            last_level (int) - last class level (default None)
+            last_class (int) - last class (default None)
+            score_range (list) - set of bounds [lb,ub] to keep only students
+                with a best overall score >= lb and <= ub (default None)
+
+        Returns:
+            (np.ndarray) - positions in students_by_idx of the students in this
+                cohort that pass the filters
+
+        The filters behave as in filter_students, but are applied as a single
+        boolean mask over the cohort's student arrays. Students with no logged
+        attempts have no best score or best attempt, and so are never
+        selected.
+        """
+
+        # Make sure the arrays reflect the current students
+        self.build_arrays()
+
+        # Combine the defined filters into a single mask, starting from the
+        # students with at least one attempt
+        mask = self.best_rows >= 0
+        if last_level is not None:
+            mask &= self.last_level_arr == last_level
+        if last_class is not None:
+            mask &= self.last_class_arr == last_class
+        if score_range is not None:
+            mask &= ((self.best_arr >= score_range[0]) &
+                     (self.best_arr <= score_range[1]))
+
+        return np.flatnonzero(mask)
 
     #--------------------------------------------------------------------------
 
@@ -352,26 +588,11 @@ class Cohort:
         a best score of 70%-100%, regardless of any of their other attributes.
         """
 
-        # Initialize output list
-        slist = []
-
-        # Process each student
-        for n in self.students:
-            # Skip students that don't pass a defined filter
-            if (last_level != None and
-                self.students[n].last_level != last_level):
-                continue
-            if (last_class != None and
-                self.students[n].last_class != last_class):
-                continue
-            if (score_range != None):
-                score = self.students[n].best_score()
-                if (score < score_range[0] or score > score_range[1]):
-                    continue
-            # If the student passes all filters, add to list
-            slist.append(self.students[n])
-
-        return slist
+        # Look up the students selected by the filter mask
+        return [self.students_by_idx[i] for i in
+                self.filter_index(last_level=last_level,
+                                  last_class=last_class,
+                                  score_range=score_range)]
 
     #--------------------------------------------------------------------------
 
@@ -394,6 +615,34 @@ class Cohort:
 
     #--------------------------------------------------------------------------
 
+    def report(self, last_level=None, last_class=None, score_range=None):
+        """Cohort.report([last_level][, last_class][, score_range])
+
+        Returns the best, last, and subject scores of all students in the
+        cohort from a single filter pass.
+
+        Keyword arguments:
+            last_level (int) - last class level filter (default None)
+            last_class (int) - last class filter (default None)
+            score_range (list) - set of bounds [lb,ub] to keep only students
+                with a best overall score >= lb and <= ub (default None)
+
+        Returns:
+            (CohortReport) - named tuple of best scores, most recent scores,
+                and a matrix of best attempt subject scores (one row per
+                student, indexed according to subject_list above)
+
+        If any filter is set to something other than None, only students
+        matching the filter value will be included.
+        """
+
+        idx = self.filter_index(last_level=last_level, last_class=last_class,
+                                score_range=score_range)
+        return CohortReport(self.best_arr[idx], self.last_arr[idx],
+                            self.subject_matrix[self.best_rows[idx]])
+
+    #--------------------------------------------------------------------------
+
     def best_scores(self, last_level=None, last_class=None, score_range=None):
         """Cohort.best_scores([last_level][, last_class][, score_range])
 
@@ -410,10 +659,8 @@ class Cohort:
         """
 
         # Return a list of student best scores that pass all filters
-        return [s.best_score() for s in
-                self.filter_students(last_level=last_level,
-                                     last_class=last_class,
-                                     score_range=score_range)]
+        return self.report(last_level=last_level, last_class=last_class,
+                           score_range=score_range).best.tolist()
     
     #--------------------------------------------------------------------------
 
@@ -459,10 +706,8 @@ class Cohort:
         matching the filter value will be included.
         """
 
-        return [s.best_score() for s in
-                self.filter_students(last_level=last_level,
-                                     last_class=last_class,
-                                     score_range=score_range)]
+        return self.report(last_level=last_level, last_class=last_class,
+                           score_range=score_range).last.tolist()
 
     #--------------------------------------------------------------------------
 
@@ -486,18 +731,16 @@ class Cohort:
         matching the filter value will be included.
         """
 
-        return [s.best_score(subjects=True)[1] for s in
-                self.filter_students(last_level=last_level,
-                                     last_class=last_class,
-                                     score_range=score_range)]
+        return self.report(last_level=last_level, last_class=last_class,
+                           score_range=score_range).subjects.tolist()
 
     #--------------------------------------------------------------------------
 
     def mastery_improvements(self, module=None):
         """Cohort.masery_improvements([module])
 
-        Returns a list of all mastery level improvements (final minus initial)
-        for all attempts.
+        Returns an array of all mastery level improvements (final minus
+        initial) for all attempts.
 
         Keyword arguments:
             module (int) - module filter (default None)
@@ -506,11 +749,15 @@ class Cohort:
         specified module will be included.
         """
 
-        m = []
-        for n in self.students:
-            m.extend(self.students[n].mastery_improvements(module=module))
+        # Make sure the arrays reflect the current students
+        self.build_arrays()
 
-        return m
+        diffs = (self.mastery_mat[:,1].astype(np.int16) -
+                 self.mastery_mat[:,0])
+        if module is None:
+            return diffs
+        else:
+            return diffs[self.module_arr == module]
 
 #==============================================================================
 
@@ -541,14 +788,21 @@ class CohortReporter:
         self.student_list = []
         self.cohort_list = []
 
+        # Initialize student lookup dictionary, mapping names to (list index,
+        # cohort tuple) for the first cohort each name appears in
+        self.student_index = {}
+
+        # Initialize cache of aggregate results, indexed by method arguments
+        self.cache = {}
+
         # Read given input file
-        if fname != None:
+        if fname is not None:
             self.read_file(fname)
 
     #--------------------------------------------------------------------------
 
-    def read_file(self, fname, quiet=False):
-        """CohortReporter.read_file(fname)
+    def read_file(self, fname, quiet=False, cache=False):
+        """CohortReporter.read_file(fname[, quiet][, cache])
 
         Gathers students and cohorts from a given input file.
 
@@ -557,6 +811,10 @@ class CohortReporter:
 
         Keyword arguments:
             quiet (bool) - whether to suppress progress messages (default False)
+            cache (bool) - whether to reuse (or save) the parsed columns from
+                a cache file next to the input file (default False)
+
+        See cached_parse_report() for how the cache file is named.
         """
 
         # Counts
@@ -567,72 +825,102 @@ class CohortReporter:
         if not quiet:
             print("Reading file '" + fname + "' ...")
 
-        with open(fname, 'r') as f:
-            first = True
-            for line in f:
-
-                # Skip the first line
-                if first:
-                    first = False
-                    continue
-
-                # Student entries begin with a quotation mark
-                if line[0] != '"':
-                    continue
-
-                # Gather tab-separated row
-                row = line.split('\t')
+        # Parse the report columns
+        if cache:
+            data = cached_parse_report(fname)
+        else:
+            data = parse_report(fname)
+        ys_arr = data["cohorts"]
+
+        # Encode names and cohorts as integer codes
+        cohort_codes = cohort_to_int(ys_arr[:,0].astype(np.int64), ys_arr[:,1])
+        name_codes, name_cats = pd.factorize(data["names"])
+
+        # Group rows by (cohort, name), in order of first appearance
+        codes, groups = pd.factorize(cohort_codes*len(name_cats) + name_codes)
+        order = np.argsort(codes, kind='stable') # rows, grouped by student
+        bounds = np.searchsorted(codes[order], np.arange(len(groups)+1))
+        starts = bounds[:-1] # first sorted row of each student
+        firsts = order[starts] # first file row of each student
+
+        # Lay out each student's attempts contiguously as raw byte buffers
+        sorted_scores = data["scores"][order]
+        with_module = data["has_module"][order]
+        score_buf = memoryview(sorted_scores.tobytes())
+        subject_buf = memoryview(data["subjects"][order].tobytes())
+        mastery_buf = memoryview(data["masteries"][order[with_module]]
+                                 .tobytes())
+        mastery_bounds = np.concatenate([[0], np.cumsum(with_module)])[bounds]
+
+        # Locate the first best attempt of each student
+        if len(groups) > 0:
+            group_best = np.maximum.reduceat(sorted_scores, starts)
+            best_rows = np.flatnonzero(sorted_scores ==
+                                       np.repeat(group_best, np.diff(bounds)))
+            best = best_rows[np.searchsorted(best_rows, starts)] - starts
+        else:
+            best = np.empty(0, dtype=np.int64)
+
+        # Cohorts indexed by integer ID, as (year, season) tuple and Cohort
+        cohort_ids = {cohort_to_int(ys[0], ys[1]): (ys, c)
+                      for ys, c in self.cohorts.items()}
+
+        # Build each student from their block of attempts
+        n = len(subject_list)
+
+        # Pause cyclic garbage collection while the student objects are
+        # created. Every new Student and Cohort is tracked by the collector, so
+        # otherwise its generation passes repeatedly rescan all the students
+        # created so far (about a quarter of the load time for 120k students).
+        # The loop creates no garbage cycles, so pausing frees nothing late,
+        # and the caller's setting is restored even if reading fails.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for (name, cid, module, level, cls, lo, hi, mlo, mhi,
+                 b) in zip(data["names"][firsts].tolist(),
+                           cohort_codes[firsts].tolist(),
+                           data["modules"][firsts].tolist(),
+                           data["levels"][firsts].tolist(),
+                           data["classes"][firsts].tolist(),
+                           starts.tolist(), bounds[1:].tolist(),
+                           mastery_bounds[:-1].tolist(),
+                           mastery_bounds[1:].tolist(), best.tolist()):
 
                 # Find cohort, and create a new Cohort if needed
-                ys = date_group(row[8]) # (year, season) ID tuple
-                if ys not in self.cohorts:
-                    self.cohorts[ys] = Cohort(ys[0], ys[1])
-                
-                # Find student name
-                name = row[0].replace('"','')
-
-                # Gather score
-                score = int(row[12].replace('%',''))
-
-                # Gather subject score list
-                subjects = [int(row[14+2*i].replace('%','')) for i in range(11)]
-
-                # Gather module and masteries
-                module = -1 # module ID
-                mastery = None # (initial, final) mastery levels
-                if len(row[35]) > 1:
-                    if "precalculus" in row[35].lower():
-                        module = 0
-                    elif "calculus" in row[35].lower():
-                        module = 1
-                    mastery = (int(row[36].replace('%','')),
-                               int(row[37].replace('%','')))
-
-                # Gather last class data
-                cls = -1 # class ID from subject_list above
-                level = -1 # class level ID
-                if len(row[41]) > 1:
-                    if "high school" in row[41].lower():
-                        level = 0
-                    elif "college" in row[41].lower():
-                        level = 1
-                    cls = class_group(row[42])
-
-                # Create new student if needed
-                if name not in self.cohorts[ys].students:
-                    self.cohorts[ys].create_student(name, module=module,
-                                                    last_level=level,
-                                                    last_class=cls)
+                try:
+                    ys, cohort = cohort_ids[cid]
+                except KeyError:
+                    ys = int_to_cohort(cid)
+                    cohort = self.cohorts[ys] = Cohort(ys[0], ys[1])
+                    cohort_ids[cid] = (ys, cohort)
+
+                # Create new student if needed, using their first row's class
+                # data
+                student = cohort.students.get(name)
+                if student is None:
+                    cohort.create_student(name, module=module,
+                                          last_level=level, last_class=cls)
+                    student = cohort.students[name]
                     total_students += 1
 
                     # Add student and their cohort to lists
+                    self.student_index.setdefault(
+                        name, (len(self.student_list), ys))
                     self.student_list.append(name)
                     self.cohort_list.append(ys)
 
-                # Add attempt information to student
-                self.cohorts[ys].update_student(name, score, subjects,
-                                                    mastery=mastery)
-                total_attempts += 1
+                # Add all attempt information to student
+                student.log_buffers(score_buf[lo:hi],
+                                    subject_buf[n*lo:n*hi],
+                                    mastery_buf[2*mlo:2*mhi], b)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        total_attempts = len(order)
+
+        # Discard aggregates computed before these students were added
+        self.invalidate_cache()
 
         # Print end message
         if not quiet:
@@ -642,6 +930,20 @@ class CohortReporter:
 
     #--------------------------------------------------------------------------
 
+    def invalidate_cache(self):
+        """CohortReporter.invalidate_cache()
+
+        Discards all cached aggregate results.
+
+        The results of report() and mastery_improvements() are cached by their
+        arguments. This is done automatically by read_file(), but should also
+        be called after modifying any students or cohorts directly.
+        """
+
+        self.cache.clear()
+
+    #--------------------------------------------------------------------------
+
     def student_by_name(self, name):
         """CohortReporter.student_by_name(name)
 
@@ -655,14 +957,12 @@ class CohortReporter:
         """
 
         # Verify that student is logged
-        if name not in self.student_list:
+        entry = self.student_index.get(name)
+        if entry is None:
             return None
 
-        # Find student index in list
-        index = self.student_list.index(name)
-
-        # Use index to find student in correct cohort
-        return self.cohorts[self.cohort_list[index]][name]
+        # Find student in correct cohort
+        return self.cohorts[entry[1]].students[name]
 
     #--------------------------------------------------------------------------
 
@@ -693,21 +993,84 @@ class CohortReporter:
     def mastery_improvements(self, module=None):
         """CohortReporter.masery_improvements([module])
 
-        Returns a list of all mastery level improvements (final minus initial)
-        for all attempts over all cohorts.
+        Returns an array of all mastery level improvements (final minus
+        initial) for all attempts over all cohorts.
 
         Keyword arguments:
             module (int) - module filter (default None)
 
         If an optional module index is specified, only students that took the
         specified module will be included.
+
+        The returned array is cached, and so is read-only.
+        """
+
+        # Check for a cached result
+        key = ("mastery_improvements", module)
+        if key in self.cache:
+            return self.cache[key]
+
+        diffs = np.concatenate([np.empty(0, dtype=np.int16)] +
+                               [c.mastery_improvements(module=module)
+                                for c in self.cohorts.values()])
+        diffs.setflags(write=False)
+        self.cache[key] = diffs
+
+        return diffs
+
+    #--------------------------------------------------------------------------
+
+    def report(self, last_level=None, last_class=None, score_range=None,
+               cohort_list=[]):
+        """CohortReporter.report([last_level][, last_class][, score_range]
+                                 [, cohort_list])
+
+        Returns the best, last, and subject scores of all students over all
+        cohorts.
+
+        Keyword arguments:
+            last_level (int) - last class level filter (default None)
+            last_class (int) - last class filter (default None)
+            score_range (list) - set of bounds [lb,ub] to keep only students
+                with a best overall score >= lb and <= ub (default None)
+            cohort_list (list) - set of cohort (year, season) tuples (default
+                empty list)
+
+        Returns:
+            (CohortReport) - named tuple of best scores, most recent scores,
+                and a matrix of best attempt subject scores, concatenated over
+                the included cohorts
+
+        If any filter is set to something other than None, only students
+        matching the filter value will be included.
+
+        The returned arrays are cached, and so are read-only.
         """
 
-        m = []
-        for ys in self.cohorts:
-            m.extend(self.cohorts[ys].mastery_improvements(module=module))
+        # Check for a cached result
+        key = ("report", last_level, last_class,
+               None if score_range is None else tuple(score_range),
+               tuple(cohort_list))
+        if key in self.cache:
+            return self.cache[key]
+
+        reports = [CohortReport(np.empty(0, dtype=np.int8),
+                                np.empty(0, dtype=np.int8),
+                                np.empty((0, len(subject_list)),
+                                         dtype=np.int8))]
+        for ys, c in self.cohorts.items():
+            if len(cohort_list) > 0 and ys not in cohort_list:
+                continue
+            reports.append(c.report(last_level=last_level,
+                                    last_class=last_class,
+                                    score_range=score_range))
+
+        result = CohortReport(*[np.concatenate(a) for a in zip(*reports)])
+        for a in result:
+            a.setflags(write=False)
+        self.cache[key] = result
 
-        return m
+        return result
 
     #--------------------------------------------------------------------------
 
@@ -730,15 +1093,9 @@ class CohortReporter:
         matching the filter value will be included.
         """
 
-        scores = []
-        for ys in self.cohorts:
-            if len(cohort_list) > 0 and ys not in cohort_list:
-                continue
-            scores.extend(self.cohorts[ys].best_scores(last_level=last_level,
-                                                       last_class=last_class,
-                                                       score_range=score_range))
-
-        return scores
+        return self.report(last_level=last_level, last_class=last_class,
+                           score_range=score_range,
+                           cohort_list=cohort_list).best.tolist()
     
     #--------------------------------------------------------------------------
 
@@ -764,12 +1121,13 @@ class CohortReporter:
         """
 
         scores = []
-        for ys in self.cohorts:
+        for ys, c in self.cohorts.items():
             if len(cohort_list) > 0 and ys not in cohort_list:
                 continue
-            scores.extend(self.cohorts[ys].best_scores_subset(last_level=
-                last_level, last_class=last_class, score_range=score_range,
-                subset=subset))
+            scores.extend(c.best_scores_subset(last_level=last_level,
+                                               last_class=last_class,
+                                               score_range=score_range,
+                                               subset=subset))
 
         return scores
 
@@ -794,15 +1152,9 @@ class CohortReporter:
         matching the filter value will be included.
         """
 
-        scores = []
-        for ys in self.cohorts:
-            if len(cohort_list) > 0 and ys not in cohort_list:
-                continue
-            scores.extend(self.cohorts[ys].last_scores(last_level=last_level,
-                                                       last_class=last_class,
-                                                       score_range=score_range))
-
-        return scores
+        return self.report(last_level=last_level, last_class=last_class,
+                           score_range=score_range,
+                           cohort_list=cohort_list).last.tolist()
 
     #--------------------------------------------------------------------------
 
@@ -825,20 +1177,216 @@ class CohortReporter:
         matching the filter value will be included.
         """
 
-        subj = []
-        for ys in self.cohorts:
-            if len(cohort_list) > 0 and ys not in cohort_list:
-                continue
-            subj.extend(self.cohorts[ys].subject_scores(last_level=last_level,
-                                                        last_class=last_class,
-                                                      score_range=score_range))
+        return self.report(last_level=last_level, last_class=last_class,
+                           score_range=score_range,
+                           cohort_list=cohort_list).subjects.tolist()
 
-        return subj
+    #--------------------------------------------------------------------------
+
+    def subject_scores_by_subject(self, last_level=None, last_class=None,
+                                  score_range=None, cohort_list=[]):
+        """CohortReporter.subject_scores_by_subject([last_level][, last_class]
+                                                    [, score_range]
+                                                    [, cohort_list])
+
+        Returns a matrix of subject scores for all students, by subject.
+
+        Keyword arguments:
+            last_level (int) - last class level filter (default None)
+            last_class (int) - last class filter (default None)
+            score_range (list) - set of bounds [lb,ub] to keep only students
+                with a best overall score >= lb and <= ub (default None)
+            cohort_list (list) - set of cohort (year, season) tuples (default
+                empty list)
+
+        Returns:
+            (np.ndarray) - matrix with one row per subject (indexed according
+                to subject_list above) and one column per student
+
+        This is the transpose of subject_scores(), with each subject's scores
+        stored contiguously.
+        """
+
+        return np.ascontiguousarray(self.report(last_level=last_level,
+                                                last_class=last_class,
+                                                score_range=score_range,
+                                                cohort_list=cohort_list)
+                                    .subjects.T)
 
 #==============================================================================
 # Functions
 #==============================================================================
 
+def parse_report(fname):
+    """parse_report(fname)
+
+    Reads the student rows of a report file into column arrays.
+
+    Positional arguments:
+        fname (str) - report file name
+
+    Returns:
+        (dict) - dictionary of NumPy arrays with one entry per attempt,
+            containing "names", "cohorts" ((year, season) ID pairs),
+            "scores", "subjects" (one row of subject scores per attempt),
+            "has_module", "masteries" (before/after pairs), "modules",
+            "levels", and "classes"
+    """
+
+    # Report columns gathered by this script
+    subject_cols = [14+2*i for i in range(len(subject_list))]
+    cols = [0, 8, 12] + subject_cols + [35, 36, 37, 41, 42]
+
+    # Read the report as raw strings, skipping the first line whatever it
+    # contains (quotes are kept so that student entries can still be
+    # identified by them)
+    df = pd.read_csv(fname, sep='\t', header=None, skiprows=1,
+                     names=range(44), index_col=False, usecols=cols,
+                     dtype=str, engine='c', quoting=csv.QUOTE_NONE,
+                     na_filter=False)
+
+    # Student entries begin with a quotation mark
+    df = df[df[0].str.startswith('"')]
+
+    # Convert percentage columns (masteries are blank without a module)
+    scores = percent_array(df[12].to_numpy())
+    subjects = percent_array(df[subject_cols].to_numpy())
+    has_module = (df[35].str.len() > 1).to_numpy()
+    masteries = df[[36, 37]].to_numpy()
+    masteries[~has_module] = '0'
+    masteries = percent_array(masteries)
+
+    # Classify module and last class fields by column
+    modules = keyword_codes(df[35], module_dict)
+    levels = keyword_codes(df[41], level_dict)
+    has_level = (df[41].str.len() > 1).to_numpy()
+    classes = np.where(has_level, class_group_array(df[42]), -1)
+
+    # Remove exactly one enclosing quote from each end of the names, keeping
+    # any quotes inside them
+    names = df[0].str[1:].str.removesuffix('"').to_numpy(dtype=str)
+
+    return {"names": names,
+            "cohorts": date_group_array(df[8]),
+            "scores": scores,
+            "subjects": subjects,
+            "has_module": has_module,
+            "masteries": masteries,
+            "modules": modules,
+            "levels": levels,
+            "classes": classes}
+
+#------------------------------------------------------------------------------
+
+def cached_parse_report(fname):
+    """cached_parse_report(fname)
+
+    Reads the student rows of a report file, reusing a saved copy of the
+    parsed columns if the file is unchanged.
+
+    Positional arguments:
+        fname (str) - report file name
+
+    Returns:
+        (dict) - dictionary of column arrays, as returned by parse_report()
+
+    The columns are saved next to the report as a NumPy .npz file named after
+    a hash of the report's contents and of the rules used to derive the
+    columns (parse_version and the keyword tables above), so that an edited
+    report or a change of rules causes the report to be parsed again. An
+    unreadable cache file is treated as missing and replaced.
+
+    Cache files for earlier versions of a report are never removed, so they
+    pile up next to it until deleted by hand.
+    """
+
+    # Name the cache after the file contents and the parsing rules
+    digest = hashlib.blake2b(digest_size=8)
+    with open(fname, 'rb') as f:
+        for chunk in iter(functools.partial(f.read, 1 << 20), b''):
+            digest.update(chunk)
+    digest.update(repr((parse_version, module_dict, level_dict,
+                        class_keywords, len(subject_list))).encode())
+    digest = digest.hexdigest()
+    cache_name = fname + "." + digest + ".npz"
+
+    # Load saved columns if available
+    if os.path.exists(cache_name):
+        try:
+            with np.load(cache_name, allow_pickle=False) as f:
+                return {k: f[k] for k in f.files}
+        except (OSError, EOFError, ValueError, zipfile.BadZipFile):
+            pass
+
+    # Otherwise parse the report and save the columns, writing to a temporary
+    # file first so that an interrupted write never leaves a partial cache
+    data = parse_report(fname)
+    tmp_name = None
+    try:
+        fd, tmp_name = tempfile.mkstemp(suffix=".tmp",
+                                        dir=os.path.dirname(cache_name) or ".")
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **data)
+        os.replace(tmp_name, cache_name)
+    except OSError:
+        if tmp_name is not None and os.path.exists(tmp_name):
+            os.remove(tmp_name)
+
+    return data
+
+#------------------------------------------------------------------------------
+
+def percent_array(values):
+    """percent_array(values)
+
+    Converts an array of percentage strings (such as "85%") into integers.
+
+    Positional arguments:
+        values (np.ndarray) - array of strings of digits, each optionally
+            followed by a percent sign, with any surrounding whitespace
+
+    Returns:
+        (np.ndarray) - int8 array of the same shape
+
+    The strings are encoded as fixed-width byte strings, and their digits are
+    accumulated one character position at a time over the whole array.
+    """
+
+    # Encode the strings as bytes, and remove surrounding whitespace and any
+    # trailing percent signs (as the int() conversion of the old parser did)
+    try:
+        raw = np.asarray(values, dtype=object).astype('S')
+    except UnicodeEncodeError:
+        raise ValueError("percentage strings must be ASCII")
+    raw = np.strings.strip(np.strings.rstrip(raw, b"% \t\n\r\x0b\x0c"))
+
+    # View the strings as a matrix of character codes, one row per string
+    raw = np.ascontiguousarray(raw)
+    width = raw.dtype.itemsize
+    chars = raw.view(np.uint8).reshape(raw.shape + (width,))
+
+    # Find the leading run of digits of each string
+    digits = chars.astype(np.int16) - ord('0')
+    lead = np.logical_and.accumulate((digits >= 0) & (digits <= 9), axis=-1)
+    count = lead.sum(axis=-1, keepdims=True)
+
+    # Allow only padding after the digits
+    bad = (np.arange(width) >= count) & (chars != 0)
+    if not lead[...,0].all() or bad.any():
+        raise ValueError("percentage strings must be digits followed by an "
+                         + "optional '%'")
+
+    # Accumulate digits from left to right
+    total = np.zeros(raw.shape, dtype=np.int32)
+    for i in range(width):
+        total = np.where(lead[...,i], 10*total + digits[...,i], total)
+    if (total > 127).any():
+        raise ValueError("percentage out of range")
+
+    return total.astype(np.int8)
+
+#------------------------------------------------------------------------------
+
 def date_group(date):
     """date_group(date)
     
@@ -855,26 +1403,79 @@ def date_group(date):
         Jan-May: Summer
         June-August: Fall
         September-December: (next) Spring
+
+    See date_group_array() for converting a whole column of dates at once.
     """
-    
-    # Gather month, day, and year
+
+    # Gather month and year
     parts = date.split('/')
     if len(parts) != 3:
         raise ValueError('date string must be in "MM/DD/YYYY" format')
-    m = int(parts[0])
-    d = int(parts[1])
-    y = int(parts[2])
-    
-    # Use month and day to determine season
-    if m <= 5:
-        return (y % 100, 0)
-    elif m <= 8:
-        return (y % 100, 1)
-    else:
-        return ((y + 1) % 100, 2)
+
+    year, season = season_group(int(parts[0]), int(parts[2]))
+    return (int(year), int(season))
 
 #------------------------------------------------------------------------------
 
+def date_group_array(dates):
+    """date_group_array(dates)
+
+    Converts a column of date strings into year/season ID pairs.
+
+    Positional arguments:
+        dates (pd.Series) - date strings, in "MM/DD/YYYY" format
+
+    Returns:
+        (np.ndarray) - array with one (2-digit year, season ID) row per date,
+            using the same season cutoffs as date_group()
+
+    Since a report contains relatively few distinct end dates, only the unique
+    date strings are parsed.
+    """
+
+    # Skip empty columns, which cannot be split
+    if len(dates) == 0:
+        return np.empty((0, 2), dtype=np.int16)
+
+    # Gather month and year columns of the unique dates
+    codes, uniques = pd.factorize(dates)
+    parts = pd.Series(uniques, dtype=str).str.split('/', expand=True)
+    if parts.shape[1] != 3 or parts.isna().any(axis=None):
+        raise ValueError('date string must be in "MM/DD/YYYY" format')
+    m = parts[0].astype(np.int16).to_numpy()
+    y = parts[2].astype(np.int16).to_numpy()
+
+    year, season = season_group(m, y)
+    return np.stack([year, season], axis=1).astype(np.int16)[codes]
+
+#------------------------------------------------------------------------------
+
+def season_group(month, year):
+    """season_group(month, year)
+
+    Converts a month and year into a 2-digit year and season ID.
+
+    Positional arguments:
+        month (int or np.ndarray) - month number (1-12)
+        year (int or np.ndarray) - full year
+
+    Returns:
+        (tuple) - 2-digit year and season ID, as integers or as arrays of the
+            same shape as the arguments
+
+    This is the season arithmetic shared by date_group() and
+    date_group_array(), using the cutoffs listed in date_group().
+    """
+
+    # Use month to determine season, moving Sep-Dec into the next year
+    season = np.add(month > 5, month > 8, dtype=np.int16)
+    year = (year + (season == 2)) % 100
+
+    return (year, season)
+
+#------------------------------------------------------------------------------
+
+@functools.lru_cache(maxsize=4096)
 def class_group(cls):
     """class_group(cls)
 
@@ -885,30 +1486,81 @@ def class_group(cls):
 
     Returns:
         (int) - a standard class ID number (see class_dict above)
+
+    Results are cached, since report files draw class names from a fairly small
+    set of distinct strings.
+
+    The name is matched against the keywords in class_keywords above in a
+    single regular expression scan, and the matched keyword with the highest
+    precedence decides the class. Algebra is ignored in linear algebra names,
+    and names with no keyword are classed as "other".
     """
-    
+
     if "no data" in cls or len(cls) < 2:
         return -1
-    elif "algebra" in cls.lower() and "linear" not in cls.lower():
-        return 1
-    elif "trigonometry" in cls.lower():
-        return 2
-    elif "geometry" in cls.lower():
-        return 3
-    elif "precalculus" in cls.lower():
-        return 4
-    elif "calculus ii" in cls.lower() or "calculus 2" in cls.lower():
-        return 6
-    elif "calculus iii" in cls.lower() or "calculus 3" in cls.lower():
-        return 7
-    elif "calculus" in cls.lower():
-        return 5
-    elif "statistics" in cls.lower() or "probability" in cls.lower():
-        return 8
-    elif "discrete" in cls.lower():
-        return 9
-    else:
+
+    # Find all class keywords in the name
+    name = cls.lower()
+    found = class_pattern.findall(name)
+    if "linear" in name:
+        found = [k for k in found if k != "algebra"]
+
+    # Use the keyword with the highest precedence
+    if len(found) == 0:
         return 0
+    return min(class_keywords[k] for k in found)[1]
+
+#------------------------------------------------------------------------------
+
+def class_group_array(classes):
+    """class_group_array(classes)
+
+    Converts a column of class names into standard class IDs.
+
+    Positional arguments:
+        classes (pd.Series) - class names
+
+    Returns:
+        (np.ndarray) - array of class IDs, as given by class_group()
+
+    Each distinct name is only classified once, and the results are then
+    spread back over the column.
+    """
+
+    codes, names = pd.factorize(classes)
+    ids = np.array([class_group(c) for c in names], dtype=np.int8)
+    return ids[codes]
+
+#------------------------------------------------------------------------------
+
+def keyword_codes(col, names):
+    """keyword_codes(col, names)
+
+    Converts a column of text fields into integer IDs by keyword matching.
+
+    Positional arguments:
+        col (pd.Series) - column of text fields
+        names (dict) - ID name dictionary (such as module_dict above)
+
+    Returns:
+        (np.ndarray) - array of IDs, with -1 for fields matching no name
+
+    Each field is given the lowest nonnegative ID whose name it contains
+    (ignoring case), so for example "Precalculus Prep" is matched to
+    precalculus rather than calculus. Only the unique fields are matched,
+    since these columns take on very few distinct values.
+    """
+
+    index, uniques = pd.factorize(col)
+    low = pd.Series(uniques, dtype=str).str.lower()
+    codes = np.full(len(uniques), -1, dtype=np.int8)
+
+    # Assign IDs in reverse order so that earlier names take precedence
+    for i in sorted(names, reverse=True):
+        if i >= 0:
+            codes[low.str.contains(names[i], regex=False).to_numpy()] = i
+
+    return codes[index]
 
 #------------------------------------------------------------------------------
 
@@ -952,16 +1604,6 @@ def int_to_cohort(index, base=16):
 
 #------------------------------------------------------------------------------
 
-def transpose(a):
-    """transpose(a)
-
-    Transposes a list of lists.
-    """
-
-    return [[a[j][i] for j in range(len(a))] for i in range(len(a[0]))]
-
-#------------------------------------------------------------------------------
-
 def riffle(*args):
     """riffle(*args)
 
@@ -1067,9 +1709,9 @@ def best_scores(last_level=None, last_class=None):
     print("\n")
     plt.figure()
     title = "Best Overall Scores (All Cohorts"
-    if last_level != None:
+    if last_level is not None:
         title += ", " + level_dict[last_level]
-    if last_class != None:
+    if last_class is not None:
         title += ", " + class_dict[last_class]
     title += ")"
     plt.title(title)
@@ -1112,7 +1754,7 @@ ax3.yaxis.grid(True, linestyle='-', which='major', color='lightgray', alpha=0.5)
 plt.title("Best Score, by Cohort")
 plt.show()
 
-bss = transpose(report.subject_scores())
+bss = report.report().subjects
 fig4, ax4 = plt.subplots()
 ax4.boxplot(bss)
 ax4.set_xticklabels(subject_list_short, rotation=45, ha='right')
@@ -1122,7 +1764,7 @@ ax4.yaxis.grid(True, linestyle='-', which='major', color='lightgray', alpha=0.5)
 plt.title("All Subject Scores")
 plt.show()
 
-bss = transpose(report.subject_scores(score_range=[70,100]))
+bss = report.report(score_range=[70,100]).subjects
 fig5, ax5 = plt.subplots()
 ax5.boxplot(bss)
 ax5.set_xticklabels(subject_list_short, rotation=45, ha='right')
@@ -1132,7 +1774,7 @@ ax5.yaxis.grid(True, linestyle='-', which='major', color='lightgray', alpha=0.5)
 plt.title("Subject Scores for Overall Scores Above 70%")
 plt.show()
 
-bss = transpose(report.subject_scores(score_range=[0,69]))
+bss = report.report(score_range=[0,69]).subjects
 fig6, ax6 = plt.subplots()
 ax6.boxplot(bss)
 ax6.set_xticklabels(subject_list_short, rotation=45, ha='right')
@@ -1146,8 +1788,8 @@ plt.show()
 # between the students placed into calculus versus precalculus at different
 # cutoff levels.
 def subject_cutoff_experiment(cutoff):
-    bsa = transpose(report.subject_scores(score_range=[cutoff,100]))
-    bsb = transpose(report.subject_scores(score_range=[0,cutoff-1]))
+    bsa = report.subject_scores_by_subject(score_range=[cutoff,100])
+    bsb = report.subject_scores_by_subject(score_range=[0,cutoff-1])
     bss = riffle(bsa, bsb)
     pos = [i + 2*(i//2) for i in range(len(bss))] # extra space between pairs
     fig, ax = plt.subplots()